@@ -0,0 +1,84 @@
+"""Накладные расходы на сериализацию одной страницы /transactions (100 строк).
+
+Сравниваются:
+  - pydantic: TransactionItem на каждую строку + валидация/сериализация по response_model
+    (то же, что делает FastAPI) + JSONResponse на stdlib json;
+  - fast: dict из сущностей + FastJSONResponse (orjson), как при FAST_RESPONSES=1.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_responses [--rows 100] [--repeat 2000]
+"""
+import argparse
+import asyncio
+import time
+from typing import Callable, List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+from core.entities.transaction import Transaction
+from infrastructure.web.controllers.user_controller import router, TransactionItem
+from infrastructure.web.responses import FastJSONResponse, transaction_payload
+
+
+def make_transactions(rows: int) -> List[Transaction]:
+    return [
+        Transaction(
+            id=i,
+            user_id=1,
+            type="predict" if i % 2 else "topup",
+            amount_cents=-5 if i % 2 else 100,
+            balance_after=1000 - i,
+            metadata={"plan": "pro", "features_len": 2} if i % 2 else {"tx_id": f"stub-{i}", "provider": "stub"},
+            created_at="2025-01-01T00:00:00+00:00",
+        )
+        for i in range(rows)
+    ]
+
+
+def transactions_field():
+    for route in router.routes:
+        if getattr(route, "path", None) == "/transactions":
+            return route.response_field
+    raise RuntimeError("/transactions route not found")
+
+
+def bench(fn: Callable[[], bytes], repeat: int) -> float:
+    fn()  # прогрев
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    txs = make_transactions(args.rows)
+    field = transactions_field()
+    loop = asyncio.new_event_loop()
+
+    def pydantic_path() -> bytes:
+        items = [TransactionItem(**transaction_payload(tx)) for tx in txs]
+        content = loop.run_until_complete(serialize_response(field=field, response_content=items))
+        return JSONResponse(content).body
+
+    def fast_path() -> bytes:
+        return FastJSONResponse([transaction_payload(tx) for tx in txs]).body
+
+    assert len(pydantic_path()) > 0 and len(fast_path()) > 0
+    slow = bench(pydantic_path, args.repeat)
+    fast = bench(fast_path, args.repeat)
+    loop.close()
+
+    print(f"rows={args.rows} repeat={args.repeat}")
+    print(f"pydantic + response_model: {slow * 1e6:9.1f} us/response")
+    print(f"fast (FAST_RESPONSES=1):   {fast * 1e6:9.1f} us/response")
+    print(f"speedup: x{slow / fast:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Пропускная способность записи в зависимости от числа шардов.
+
+Каждый воркер (отдельный процесс, чтобы не упираться в GIL) в цикле делает то же,
+что биллинг /predict: debit_if_sufficient + log_transaction для случайного пользователя.
+Все прогоны используют одну и ту же конфигурацию (WAL, пул соединений, одинаковый synchronous),
+меняется только число шардов; ускорение считается относительно 1 шарда.
+
+Нагрузки:
+  - FULL   — durable-коммиты (fsync на каждый коммит, значение по умолчанию DB_SYNCHRONOUS);
+             здесь шарды могут выиграть, т.к. fsync разных файлов идут параллельно;
+  - NORMAL — без fsync на коммит; упирается в CPU, от числа шардов почти не зависит.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_sharded_writes [--shards 1 2 4 8] [--workers 8] [--seconds 3] [--synchronous FULL NORMAL] [--dir /path/on/target/disk]
+
+--dir задаёт, где создавать временные базы: результат FULL определяется fsync конкретного диска.
+"""
+import argparse
+import multiprocessing as mp
+import random
+import tempfile
+import time
+from typing import List, Optional, Tuple
+
+from infrastructure.db.sharded_sqlite import init_sharded_db, ShardedSQLiteUserRepository
+
+
+USERS = 256
+START_BALANCE = 10 ** 9
+
+
+def _billing_op(repo, user_id: int) -> None:
+    updated = repo.debit_if_sufficient(user_id, 1)
+    repo.log_transaction(user_id, "predict", -1, updated.balance_cents, {"plan": "basic", "features_len": 2})
+
+
+def _worker(db_dir: str, shard_count: int, synchronous: str, user_ids: List[int],
+            start_at: float, seconds: float, seed: int) -> Tuple[int, float]:
+    rnd = random.Random(seed)
+    repo = ShardedSQLiteUserRepository(db_dir, shard_count, pool_size=1, synchronous=synchronous)
+    # общий старт, чтобы не учитывать запуск процессов
+    time.sleep(max(0.0, start_at - time.time()))
+    done = 0
+    started = time.perf_counter()
+    try:
+        while time.perf_counter() - started < seconds:
+            _billing_op(repo, rnd.choice(user_ids))
+            done += 1
+    finally:
+        elapsed = time.perf_counter() - started
+        repo.close()
+    return done, elapsed
+
+
+def prepare(db_dir: str, shard_count: int, synchronous: str) -> List[int]:
+    init_sharded_db(db_dir, shard_count)
+    repo = ShardedSQLiteUserRepository(db_dir, shard_count, synchronous=synchronous)
+    ids = []
+    try:
+        for i in range(USERS):
+            user = repo.create_user(f"user{i}@bench.local", "x")
+            repo.add_balance(user.id, START_BALANCE)
+            ids.append(user.id)
+    finally:
+        repo.close()
+    return ids
+
+
+def run(shard_count: int, synchronous: str, workers: int, seconds: float, base_dir: Optional[str] = None) -> float:
+    with tempfile.TemporaryDirectory(dir=base_dir) as db_dir:
+        ids = prepare(db_dir, shard_count, synchronous)
+        with mp.get_context("spawn").Pool(workers) as pool:
+            start_at = time.time() + 1.0
+            results = pool.starmap(
+                _worker,
+                [(db_dir, shard_count, synchronous, ids, start_at, seconds, seed) for seed in range(workers)],
+            )
+        return sum(done / elapsed for done, elapsed in results)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--synchronous", nargs="+", default=["FULL", "NORMAL"])
+    parser.add_argument("--dir", default=None, help="где создавать временные базы (по умолчанию системный tmp)")
+    args = parser.parse_args()
+
+    shard_counts = sorted(set(args.shards) | {1})
+    print(f"workers={args.workers} seconds={args.seconds} users={USERS} dir={args.dir or tempfile.gettempdir()}")
+    for synchronous in args.synchronous:
+        print(f"synchronous={synchronous}")
+        baseline = None
+        for n in shard_counts:
+            ops = run(n, synchronous, args.workers, args.seconds, args.dir)
+            baseline = baseline or ops
+            print(f"  {n:>3} shard(s): {ops:9.0f} billing ops/s  (x{ops / baseline:.2f} vs 1 shard)")
+
+
+if __name__ == "__main__":
+    main()
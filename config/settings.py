@@ -8,16 +8,45 @@ class Settings:
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
     DB_PATH: str = os.getenv("DB_PATH", "./app.db")
+    # шардирование пользователей: 0 — один файл DB_PATH, N — N файлов в DB_SHARD_DIR.
+    # экспериментально: выигрыш по записи не подтверждён (см. benchmarks/bench_sharded_writes.py)
+    DB_SHARD_COUNT: int = int(os.getenv("DB_SHARD_COUNT", "0"))
+    DB_SHARD_DIR: str = os.getenv("DB_SHARD_DIR", "./data/shards")
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "4"))
+    # PRAGMA synchronous для шардов (WAL); NORMAL быстрее, но теряет последние коммиты при отключении питания
+    DB_SYNCHRONOUS: str = os.getenv("DB_SYNCHRONOUS", "FULL")
 
     MODEL_BASIC_PATH: str = os.getenv("MODEL_BASIC_PATH", "./models/basic/model_basic.pkl")
     MODEL_PRO_PATH: str = os.getenv("MODEL_PRO_PATH", "./models/pro/model_pro.pkl")
     MODEL_PREMIUM_PATH: str = os.getenv("MODEL_PREMIUM_PATH", "./models/premium/model_premium.pkl")
 
+    # теневая оценка кандидата: пусто — выключена
+    SHADOW_MODEL_PATH: str = os.getenv("SHADOW_MODEL_PATH", "")
+    SHADOW_PLAN: str = os.getenv("SHADOW_PLAN", "premium")
+    SHADOW_SAMPLE_RATE: float = float(os.getenv("SHADOW_SAMPLE_RATE", "0.1"))
+    SHADOW_QUEUE_SIZE: int = int(os.getenv("SHADOW_QUEUE_SIZE", "100"))
+
     PRICE_BASIC_INFER_CREDITS: int = int(os.getenv("PRICE_BASIC_INFER_CREDITS", "1"))
     PRICE_PRO_INFER_CREDITS: int = int(os.getenv("PRICE_PRO_INFER_CREDITS", "5"))
     PRICE_PREMIUM_INFER_CREDITS: int = int(os.getenv("PRICE_PREMIUM_INFER_CREDITS", "20"))
 
+    PREDICT_MAX_FEATURES: int = int(os.getenv("PREDICT_MAX_FEATURES", "4096"))
+
     TOPUP_DEFAULT_AMOUNT_CENTS: int = int(os.getenv("TOPUP_DEFAULT_AMOUNT_CENTS", "100"))
 
+    # Idempotency-Key: хранилище завершённых ответов
+    IDEMPOTENCY_DB_PATH: str = os.getenv("IDEMPOTENCY_DB_PATH", "./idempotency.db")
+    IDEMPOTENCY_TTL_SECONDS: float = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+    IDEMPOTENCY_CACHE_SIZE: int = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+    IDEMPOTENCY_WAIT_SECONDS: float = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30"))
+
+    # лог медленных запросов с разбивкой по стадиям; 0 — выключен
+    SLOW_REQUEST_MS: float = float(os.getenv("SLOW_REQUEST_MS", "500"))
+    # верхняя граница длительности /admin/profile
+    PROFILE_MAX_SECONDS: float = float(os.getenv("PROFILE_MAX_SECONDS", "30"))
+
+    # быстрая сериализация ответов (orjson, без повторной валидации response_model)
+    FAST_RESPONSES: bool = os.getenv("FAST_RESPONSES", "0").lower() in {"1", "true", "yes"}
+
 settings = Settings()
 print(settings)
\ No newline at end of file
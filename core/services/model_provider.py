@@ -1,11 +1,14 @@
 from abc import ABC, abstractmethod
-from typing import List, Any
+from typing import Sequence, Any
 
 
 class Model(ABC):
     @abstractmethod
-    def predict_one(self, features: List[float]) -> Any: ...
+    def predict_one(self, features: Sequence[float]) -> Any: ...
 
 class ModelProvider(ABC):
     @abstractmethod
     def get_model(self, plan: str) -> Model: ...
+
+    def observe(self, plan: str, features: Sequence[float], result: Any, latency_seconds: float) -> None:
+        """Хук после инференса (например, теневая оценка); не должен блокировать и бросать исключения"""
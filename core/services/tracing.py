@@ -0,0 +1,57 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+
+
+class RequestTrace:
+    """Замеры стадий одного запроса: (имя стадии, длительность в секундах)"""
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+
+    def add(self, name: str, duration: float) -> None:
+        # list.append атомарен, стадии могут писаться из потоков to_thread/threadpool
+        self.spans.append((name, duration))
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def breakdown(self) -> str:
+        return " ".join(f"{name}={duration * 1000:.2f}ms" for name, duration in self.spans)
+
+
+# context копируется в to_thread и threadpool, так что ссылка на trace доступна и там
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+
+
+def start_trace(name: str):
+    """Возвращает (trace, token); token передаётся в end_trace"""
+    trace = RequestTrace(name)
+    return trace, _current_trace.set(trace)
+
+def end_trace(token) -> None:
+    _current_trace.reset(token)
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def record(name: str, duration: float) -> None:
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, duration)
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Замер стадии; без активного trace почти ничего не стоит"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - started)
@@ -1,45 +1,67 @@
-from typing import List, Any, Tuple, Dict
+from typing import Sequence, Any, Tuple, Dict
 from core.entities.user import User
 from core.repositories.user_repository import UserRepository
 from core.services.model_provider import ModelProvider
+from core.services.tracing import span, record
 import asyncio
 import inspect
+import time
 
 
 class InsufficientFundsError(ValueError):
     pass
 
+def _predict_in_thread(predict_one, features: Sequence[float], scheduled_at: float) -> Tuple[Any, float, float]:
+    # время ожидания свободного потока и время возврата в event loop считаем отдельно от самой модели
+    started = time.perf_counter()
+    record("predict.thread_wait", started - scheduled_at)
+    with span("predict.model"):
+        result = predict_one(features)
+    finished = time.perf_counter()
+    return result, finished - started, finished
+
 async def predict_with_billing_async(
     repo: UserRepository,
     provider: ModelProvider,
     user: User,
-    features: List[float],
+    features: Sequence[float],
     prices: Dict[str, int],
 ) -> Tuple[float, int, User]:
     plan = (user.plan or "basic").lower()
     if plan not in prices:
         raise ValueError("Unsupported plan")
 
-    model = provider.get_model(plan)
+    with span("predict.get_model"):
+        model = provider.get_model(plan)
     print(model)
     predict_async = getattr(model, "predict_one_async", None)
     if predict_async and inspect.iscoroutinefunction(predict_async):
-        result = await predict_async(features)
+        started = time.perf_counter()
+        with span("predict.model"):
+            result = await predict_async(features)
+        model_seconds = time.perf_counter() - started
     else:
-        result = await asyncio.to_thread(model.predict_one, features)
+        result, model_seconds, finished_at = await asyncio.to_thread(
+            _predict_in_thread, model.predict_one, features, time.perf_counter()
+        )
+        record("predict.thread_return", time.perf_counter() - finished_at)
 
     price = int(prices[plan])
     if price > 0:
-        updated_user = repo.debit_if_sufficient(user.id, price)
+        with span("billing.debit"):
+            updated_user = repo.debit_if_sufficient(user.id, price)
         # логгируем транзакцию
-        repo.log_transaction(
-            user_id=user.id,
-            type="predict",
-            amount_cents=-price,
-            balance_after=updated_user.balance_cents,
-            metadata={"plan": plan, "features_len": len(features)},
-        )
+        with span("billing.log_transaction"):
+            repo.log_transaction(
+                user_id=user.id,
+                type="predict",
+                amount_cents=-price,
+                balance_after=updated_user.balance_cents,
+                metadata={"plan": plan, "features_len": len(features)},
+            )
     else:
         updated_user = user
 
+    # только запросы, которые дошли до пользователя: неуспешный биллинг в теневую оценку не попадает
+    provider.observe(plan, features, result, model_seconds)
     return result, price, updated_user
\ No newline at end of file
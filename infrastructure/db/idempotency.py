@@ -0,0 +1,104 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Tuple
+
+
+@dataclass
+class StoredResponse:
+    fingerprint: str        # хэш запроса, чтобы ловить повтор ключа с другим телом
+    status_code: int
+    body: bytes             # готовый JSON ответа
+    expires_at: float       # unix time
+
+
+def init_idempotency_db(db_path: str) -> None:
+    if db_path != ":memory:" and not db_path.startswith("file:"):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            user_id INTEGER NOT NULL,
+            scope TEXT NOT NULL,
+            key TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            status_code INTEGER NOT NULL,
+            body BLOB NOT NULL,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (user_id, scope, key)
+        );
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_idempotency_expires ON idempotency_keys(expires_at);")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class SQLiteIdempotencyStore:
+    """Завершённые ответы по Idempotency-Key: SQLite с TTL + LRU-кэш в памяти перед ним"""
+    PURGE_EVERY = 256  # раз в столько записей чистим протухшие строки
+
+    def __init__(self, db_path: str, ttl_seconds: float, cache_size: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.cache_size = cache_size
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple[int, str, str], StoredResponse]" = OrderedDict()
+        self._puts = 0
+
+    def _cache_put(self, ident: Tuple[int, str, str], stored: StoredResponse) -> None:
+        self._cache[ident] = stored
+        self._cache.move_to_end(ident)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def get(self, user_id: int, scope: str, key: str) -> Optional[StoredResponse]:
+        ident = (int(user_id), scope, key)
+        now = time.time()
+        with self._lock:
+            stored = self._cache.get(ident)
+            if stored is not None:
+                if stored.expires_at > now:
+                    self._cache.move_to_end(ident)
+                    return stored
+                del self._cache[ident]
+                return None
+            row = self.conn.execute(
+                "SELECT fingerprint, status_code, body, expires_at FROM idempotency_keys "
+                "WHERE user_id = ? AND scope = ? AND key = ? AND expires_at > ?",
+                (*ident, now),
+            ).fetchone()
+            if row is None:
+                return None
+            stored = StoredResponse(fingerprint=row[0], status_code=int(row[1]), body=bytes(row[2]), expires_at=float(row[3]))
+            self._cache_put(ident, stored)
+            return stored
+
+    def put(self, user_id: int, scope: str, key: str, fingerprint: str, status_code: int, body: bytes) -> StoredResponse:
+        ident = (int(user_id), scope, key)
+        now = time.time()
+        stored = StoredResponse(fingerprint=fingerprint, status_code=status_code, body=body, expires_at=now + self.ttl_seconds)
+        with self._lock:
+            try:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO idempotency_keys (user_id, scope, key, fingerprint, status_code, body, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (*ident, fingerprint, int(status_code), body, stored.expires_at),
+                )
+                self._puts += 1
+                if self._puts % self.PURGE_EVERY == 0:
+                    self.conn.execute("DELETE FROM idempotency_keys WHERE expires_at <= ?", (now,))
+                self.conn.commit()
+            except Exception:
+                # не оставляем открытую транзакцию на общем соединении
+                self.conn.rollback()
+                raise
+            self._cache_put(ident, stored)
+        return stored
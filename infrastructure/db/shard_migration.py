@@ -0,0 +1,97 @@
+"""Разбиение app.db (или существующего набора шардов) на N шардов.
+
+    python -m infrastructure.db.shard_migration --source ./app.db --shard-dir ./data/shards --shards 4
+    python -m infrastructure.db.shard_migration --source-shard-dir ./data/shards --shard-dir ./data/shards8 --shards 8
+
+Источники открываются только на чтение; целевой каталог должен быть пустым.
+id пользователей сохраняются, id транзакций выдаются заново (порядок внутри пользователя сохраняется).
+"""
+import argparse
+import sqlite3
+from pathlib import Path
+from typing import Dict, List
+
+from infrastructure.db.sharded_sqlite import (
+    init_sharded_db, shard_path, directory_path, connect_wal, DIRECTORY_FILE,
+)
+
+
+USER_COLUMNS = ("id", "email", "password_hash", "is_admin", "balance_cents", "created_at", "plan")
+TX_COLUMNS = ("user_id", "type", "amount_cents", "balance_after", "metadata", "created_at")
+
+
+def _open_readonly(path: str) -> sqlite3.Connection:
+    if not Path(path).exists():
+        raise FileNotFoundError(path)
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def list_shard_files(shard_dir: str) -> List[str]:
+    return sorted(str(p) for p in Path(shard_dir).glob("users_*.db"))
+
+
+def migrate_to_shards(sources: List[str], shard_dir: str, shard_count: int, batch_size: int = 1000) -> Dict[str, int]:
+    target = Path(shard_dir)
+    if (target / DIRECTORY_FILE).exists() or list_shard_files(shard_dir):
+        raise ValueError(f"Target directory {shard_dir} already contains shards")
+    init_sharded_db(shard_dir, shard_count)
+
+    directory = connect_wal(directory_path(shard_dir))
+    shards = [connect_wal(shard_path(shard_dir, i)) for i in range(shard_count)]
+    stats = {"users": 0, "transactions": 0}
+    user_sql = f"INSERT INTO users ({', '.join(USER_COLUMNS)}) VALUES ({', '.join('?' * len(USER_COLUMNS))})"
+    tx_sql = f"INSERT INTO transactions ({', '.join(TX_COLUMNS)}) VALUES ({', '.join('?' * len(TX_COLUMNS))})"
+    try:
+        for source in sources:
+            src = _open_readonly(source)
+            try:
+                cur = src.execute(f"SELECT {', '.join(USER_COLUMNS)} FROM users ORDER BY id")
+                while rows := cur.fetchmany(batch_size):
+                    directory.executemany(
+                        "INSERT INTO user_directory (id, email) VALUES (?, ?)",
+                        [(r["id"], r["email"]) for r in rows],
+                    )
+                    for r in rows:
+                        shards[r["id"] % shard_count].execute(user_sql, tuple(r))
+                    stats["users"] += len(rows)
+
+                cur = src.execute(f"SELECT {', '.join(TX_COLUMNS)} FROM transactions ORDER BY id")
+                while rows := cur.fetchmany(batch_size):
+                    for r in rows:
+                        shards[r["user_id"] % shard_count].execute(tx_sql, tuple(r))
+                    stats["transactions"] += len(rows)
+            finally:
+                src.close()
+            # коммитим после каждого источника: справочник и шарды согласованы по источнику целиком
+            directory.commit()
+            for conn in shards:
+                conn.commit()
+    finally:
+        directory.close()
+        for conn in shards:
+            conn.close()
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Split users database into N SQLite shards")
+    parser.add_argument("--source", action="append", default=[], help="source SQLite file (repeatable)")
+    parser.add_argument("--source-shard-dir", help="existing shard directory to rebalance")
+    parser.add_argument("--shard-dir", required=True, help="target directory for the new shards")
+    parser.add_argument("--shards", type=int, required=True, help="number of target shards")
+    args = parser.parse_args()
+
+    sources = list(args.source)
+    if args.source_shard_dir:
+        sources += list_shard_files(args.source_shard_dir)
+    if not sources:
+        parser.error("at least one --source or --source-shard-dir is required")
+
+    stats = migrate_to_shards(sources, args.shard_dir, args.shards)
+    print(f"Migrated {stats['users']} users and {stats['transactions']} transactions into {args.shards} shards")
+
+
+if __name__ == "__main__":
+    main()
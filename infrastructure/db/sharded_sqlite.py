@@ -0,0 +1,213 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Iterator
+
+from core.entities.user import User
+from core.entities.transaction import Transaction
+from core.repositories.user_repository import UserRepository
+from infrastructure.db.sqlite import init_db, SQLiteUserRepository
+
+
+DIRECTORY_FILE = "directory.db"
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+def shard_path(shard_dir: str, index: int) -> str:
+    return str(Path(shard_dir) / f"users_{index:03d}.db")
+
+def directory_path(shard_dir: str) -> str:
+    return str(Path(shard_dir) / DIRECTORY_FILE)
+
+
+def connect_wal(db_path: str, synchronous: str = "FULL", busy_timeout_ms: int = 5000) -> sqlite3.Connection:
+    # FULL — как у обычного соединения: коммит переживает отключение питания.
+    # NORMAL в WAL быстрее, но последние коммиты (балансы, журнал транзакций) могут потеряться
+    synchronous = synchronous.upper()
+    if synchronous not in SYNCHRONOUS_MODES:
+        raise ValueError(f"synchronous must be one of: {', '.join(SYNCHRONOUS_MODES)}")
+    conn = sqlite3.connect(db_path, check_same_thread=False, timeout=busy_timeout_ms / 1000)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+    conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+    return conn
+
+
+def init_directory(db_path: str, shard_count: int) -> None:
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    try:
+        cur = conn.cursor()
+        # справочник: выдаёт глобальные id и хранит email -> id
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS user_directory (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL
+        );
+        """)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS shard_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        """)
+        cur.execute("INSERT OR IGNORE INTO shard_meta (key, value) VALUES ('shard_count', ?)", (str(shard_count),))
+        conn.commit()
+        cur.execute("SELECT value FROM shard_meta WHERE key = 'shard_count'")
+        existing = int(cur.fetchone()[0])
+    finally:
+        conn.close()
+    if existing != shard_count:
+        raise ValueError(
+            f"Shard directory was created for {existing} shards, not {shard_count}; "
+            f"use infrastructure.db.shard_migration to rebalance"
+        )
+
+
+def init_sharded_db(shard_dir: str, shard_count: int) -> None:
+    if shard_count < 1:
+        raise ValueError("shard_count must be positive")
+    Path(shard_dir).mkdir(parents=True, exist_ok=True)
+    init_directory(directory_path(shard_dir), shard_count)
+    for i in range(shard_count):
+        init_db(shard_path(shard_dir, i))
+
+
+class SQLiteConnectionPool:
+    """Пул соединений к одному файлу SQLite (WAL), соединения создаются лениво"""
+    def __init__(self, db_path: str, size: int = 4, timeout: float = 30.0, synchronous: str = "FULL"):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self.synchronous = synchronous
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return connect_wal(self.db_path, self.synchronous)
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise RuntimeError(f"Timed out waiting for a connection to {self.db_path}")
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._acquire()
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+
+class ShardedSQLiteUserRepository(UserRepository):
+    """Пользователи разнесены по N файлам SQLite: шард = user_id % N.
+
+    Глобальные id и поиск по email — через отдельный справочник (directory.db).
+    Транзакции пользователя лежат в его шарде, поэтому id транзакций уникальны только в пределах шарда.
+    """
+    def __init__(self, shard_dir: str, shard_count: int, pool_size: int = 4, synchronous: str = "FULL"):
+        if shard_count < 1:
+            raise ValueError("shard_count must be positive")
+        self.shard_count = shard_count
+        self._directory = SQLiteConnectionPool(directory_path(shard_dir), pool_size, synchronous=synchronous)
+        self._shards = [
+            SQLiteConnectionPool(shard_path(shard_dir, i), pool_size, synchronous=synchronous)
+            for i in range(shard_count)
+        ]
+
+    def shard_for(self, user_id: int) -> int:
+        return int(user_id) % self.shard_count
+
+    @contextmanager
+    def _shard_repo(self, user_id: int) -> Iterator[SQLiteUserRepository]:
+        with self._shards[self.shard_for(user_id)].connection() as conn:
+            yield SQLiteUserRepository(conn)
+
+    def close(self) -> None:
+        self._directory.close()
+        for pool in self._shards:
+            pool.close()
+
+    def create_user(self, email: str, password_hash: str, is_admin: bool = False, plan: str = "basic") -> User:
+        with self._directory.connection() as conn:
+            cur = conn.execute("INSERT INTO user_directory (email) VALUES (?)", (email,))
+            conn.commit()
+            user_id = cur.lastrowid
+
+        created_at = datetime.now(timezone.utc).isoformat()
+        try:
+            with self._shards[self.shard_for(user_id)].connection() as conn:
+                conn.execute(
+                    "INSERT INTO users (id, email, password_hash, is_admin, balance_cents, created_at, plan) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (user_id, email, password_hash, 1 if is_admin else 0, 0, created_at, plan),
+                )
+                conn.commit()
+        except Exception:
+            # откатываем запись в справочнике, чтобы email не завис без пользователя
+            with self._directory.connection() as conn:
+                conn.execute("DELETE FROM user_directory WHERE id = ?", (user_id,))
+                conn.commit()
+            raise
+        return User(id=user_id, email=email, password_hash=password_hash,
+                    is_admin=is_admin, balance_cents=0, created_at=created_at, plan=plan)
+
+    def get_by_email(self, email: str) -> Optional[User]:
+        with self._directory.connection() as conn:
+            row = conn.execute("SELECT id FROM user_directory WHERE email = ?", (email,)).fetchone()
+        return self.get_by_id(row["id"]) if row else None
+
+    def get_by_id(self, user_id: int) -> Optional[User]:
+        with self._shard_repo(user_id) as repo:
+            return repo.get_by_id(user_id)
+
+    def add_balance(self, user_id: int, delta_cents: int) -> User:
+        with self._shard_repo(user_id) as repo:
+            return repo.add_balance(user_id, delta_cents)
+
+    def debit_if_sufficient(self, user_id: int, amount_cents: int) -> User:
+        with self._shard_repo(user_id) as repo:
+            return repo.debit_if_sufficient(user_id, amount_cents)
+
+    def update_plan(self, user_id: int, plan: str) -> User:
+        with self._shard_repo(user_id) as repo:
+            return repo.update_plan(user_id, plan)
+
+    def log_transaction(self, user_id: int, type: str, amount_cents: int, balance_after: int, metadata: Optional[Dict[str, Any]] = None) -> None:
+        with self._shard_repo(user_id) as repo:
+            repo.log_transaction(user_id, type, amount_cents, balance_after, metadata)
+
+    def list_transactions(self, user_id: int, limit: int = 100, offset: int = 0) -> List[Transaction]:
+        with self._shard_repo(user_id) as repo:
+            return repo.list_transactions(user_id, limit=limit, offset=offset)
@@ -0,0 +1,135 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, Optional, Sequence
+
+import numpy as np
+
+from core.services.model_provider import Model
+
+
+def _summary_ms(values: Deque[float]) -> Optional[Dict[str, float]]:
+    if not values:
+        return None
+    arr = np.fromiter(values, dtype=float) * 1000
+    return {
+        "mean": float(arr.mean()),
+        "p50": float(np.percentile(arr, 50)),
+        "p95": float(np.percentile(arr, 95)),
+        "max": float(arr.max()),
+    }
+
+
+class ShadowEvaluator:
+    """Теневая оценка модели-кандидата на живом трафике.
+
+    Часть запросов (sample_rate) копируется в отдельный executor, где их считает кандидат;
+    сравниваются задержка и предсказание с основной моделью. Пользовательский запрос не ждёт
+    и не платит: при заполненной очереди (queue_size задач) работа отбрасывается.
+    """
+    def __init__(self, candidate: Model, plan: str, sample_rate: float, queue_size: int,
+                 candidate_path: str = "", window: int = 1000):
+        self.candidate = candidate
+        self.plan = plan.lower()
+        self.sample_rate = sample_rate
+        self.queue_size = queue_size
+        self.candidate_path = candidate_path
+        self._slots = threading.BoundedSemaphore(max(1, queue_size))
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow-eval")
+        self._lock = threading.Lock()
+
+        self.submitted = 0
+        self.dropped = 0
+        self.evaluated = 0
+        self.errors = 0
+        self.agreed = 0
+        self._sum_delta = 0.0
+        self._sum_abs_delta = 0.0
+        self._max_abs_delta = 0.0
+        self._numeric = 0
+        # скользящее окно для перцентилей
+        self._primary_latency: Deque[float] = deque(maxlen=window)
+        self._candidate_latency: Deque[float] = deque(maxlen=window)
+        self._abs_deltas: Deque[float] = deque(maxlen=window)
+
+    def submit(self, plan: str, features: Sequence[float], primary_result: Any, primary_seconds: float) -> None:
+        """Неблокирующая постановка в очередь; никогда не бросает исключений"""
+        try:
+            if plan.lower() != self.plan or random.random() >= self.sample_rate:
+                return
+            if not self._slots.acquire(blocking=False):
+                with self._lock:
+                    self.dropped += 1
+                return
+            try:
+                # копия: буфер запроса может быть переиспользован после ответа
+                self._executor.submit(self._evaluate, np.array(features, dtype=float), primary_result, primary_seconds)
+            except RuntimeError:
+                self._slots.release()
+                with self._lock:
+                    self.dropped += 1
+                return
+            with self._lock:
+                self.submitted += 1
+        except Exception as e:
+            print(f"Shadow submit failed: {e}")
+
+    def _evaluate(self, features: np.ndarray, primary_result: Any, primary_seconds: float) -> None:
+        # любая ошибка (и в модели, и при сравнении) учитывается в errors, а не теряется в future executor'а
+        try:
+            started = time.perf_counter()
+            result = self.candidate.predict_one(features)
+            elapsed = time.perf_counter() - started
+            self._record(primary_result, result, primary_seconds, elapsed)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+        finally:
+            self._slots.release()
+
+    def _record(self, primary: Any, candidate: Any, primary_seconds: float, candidate_seconds: float) -> None:
+        try:
+            delta = float(candidate) - float(primary)
+        except (TypeError, ValueError):
+            delta = None
+        # array_equal: у массивов == поэлементное, bool() от него бросает
+        agreed = bool(np.array_equal(np.asarray(candidate), np.asarray(primary)))
+        with self._lock:
+            self.evaluated += 1
+            self.agreed += int(agreed)
+            self._primary_latency.append(primary_seconds)
+            self._candidate_latency.append(candidate_seconds)
+            if delta is not None:
+                self._numeric += 1
+                self._sum_delta += delta
+                self._sum_abs_delta += abs(delta)
+                self._max_abs_delta = max(self._max_abs_delta, abs(delta))
+                self._abs_deltas.append(abs(delta))
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            abs_deltas = np.fromiter(self._abs_deltas, dtype=float)
+            return {
+                "plan": self.plan,
+                "candidate_path": self.candidate_path,
+                "sample_rate": self.sample_rate,
+                "queue_size": self.queue_size,
+                "submitted": self.submitted,
+                "evaluated": self.evaluated,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "agreement_rate": self.agreed / self.evaluated if self.evaluated else None,
+                "primary_latency_ms": _summary_ms(self._primary_latency),
+                "candidate_latency_ms": _summary_ms(self._candidate_latency),
+                "delta": {
+                    "mean": self._sum_delta / self._numeric,
+                    "mean_abs": self._sum_abs_delta / self._numeric,
+                    "max_abs": self._max_abs_delta,
+                    "p95_abs": float(np.percentile(abs_deltas, 95)),
+                } if self._numeric else None,
+            }
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
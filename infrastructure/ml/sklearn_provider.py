@@ -1,8 +1,10 @@
-from typing import List, Any, Dict
+from typing import Sequence, Any, Dict, Optional
 from threading import Lock
 import os
+import numpy as np
 from core.services.model_provider import Model, ModelProvider
 from config.settings import settings
+from infrastructure.ml.shadow import ShadowEvaluator
 
 
 try:
@@ -15,20 +17,22 @@ class SklearnModelWrapper(Model):
     """У моделей sklearn единый интерфейс"""
     def __init__(self, estimator):
         self.estimator = estimator
-    def predict_one(self, features: List[float]) -> Any:
-        return self.estimator.predict([features])[0]
+    def predict_one(self, features: Sequence[float]) -> Any:
+        # для np.ndarray (бинарный /predict) это view, без копирования
+        return self.estimator.predict(np.asarray(features).reshape(1, -1))[0]
 
 
 class FallbackStubModel(Model):
     """Класс-заглушка, который всегда возвращает 1"""
-    def predict_one(self, features: List[float]) -> Any:
+    def predict_one(self, features: Sequence[float]) -> Any:
         return 1 if sum(float(x) for x in features) >= 0 else 0
 
 
 class SklearnModelProvider(ModelProvider):
     """Provider для моделей sklearn"""
-    def __init__(self, paths: Dict[str, str]):
+    def __init__(self, paths: Dict[str, str], shadow: Optional[ShadowEvaluator] = None):
         self.paths = paths
+        self.shadow = shadow
         self._models: Dict[str, Model] = {}
         self._lock = Lock()
 
@@ -53,9 +57,28 @@ class SklearnModelProvider(ModelProvider):
             self._models[key] = model
             return model
 
+    def observe(self, plan: str, features: Sequence[float], result: Any, latency_seconds: float) -> None:
+        if self.shadow is not None:
+            self.shadow.submit(plan, features, result, latency_seconds)
+
 def build_sklearn_provider() -> SklearnModelProvider:
-    return SklearnModelProvider({
+    provider = SklearnModelProvider({
         "basic": settings.MODEL_BASIC_PATH,
         "pro": settings.MODEL_PRO_PATH,
         "premium": settings.MODEL_PREMIUM_PATH,
     })
+    path = settings.SHADOW_MODEL_PATH
+    if path and settings.SHADOW_SAMPLE_RATE > 0:
+        candidate = provider._load_model_from_path(path)
+        # при любой ошибке загрузки приходит заглушка — сравнивать с ней бессмысленно, выключаем тень
+        if isinstance(candidate, SklearnModelWrapper):
+            provider.shadow = ShadowEvaluator(
+                candidate=candidate,
+                plan=settings.SHADOW_PLAN,
+                sample_rate=settings.SHADOW_SAMPLE_RATE,
+                queue_size=settings.SHADOW_QUEUE_SIZE,
+                candidate_path=path,
+            )
+        else:
+            print(f"Shadow model could not be loaded from {path}, shadow evaluation disabled")
+    return provider
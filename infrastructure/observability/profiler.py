@@ -0,0 +1,69 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import Dict
+
+
+class ProfilerBusyError(RuntimeError):
+    pass
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    path = code.co_filename
+    try:
+        rel = os.path.relpath(path)
+        if not rel.startswith(".."):
+            path = rel
+    except ValueError:
+        pass
+    # co_firstlineno, а не f_lineno: иначе одна функция распадается на много узлов флеймграфа
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+def _collapse(frame: FrameType, thread_name: str) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+class SamplingProfiler:
+    """Сэмплирующий профайлер живого процесса через sys._current_frames().
+
+    Раз в interval снимает стеки всех потоков (кроме своего) и считает одинаковые стеки.
+    Одновременно допускается один прогон.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def sample(self, seconds: float, interval: float) -> Dict[str, int]:
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("Profiler is already running")
+        try:
+            own_id = threading.get_ident()
+            stacks: Counter = Counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_id:
+                        continue
+                    stacks[_collapse(frame, names.get(thread_id, f"thread-{thread_id}"))] += 1
+                time.sleep(interval)
+            return dict(stacks)
+        finally:
+            self._lock.release()
+
+
+def render_collapsed(stacks: Dict[str, int]) -> str:
+    """Формат collapsed stacks ('a;b;c 42'), понимают flamegraph.pl, speedscope, inferno"""
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items(), key=lambda kv: -kv[1]))
+
+
+profiler = SamplingProfiler()
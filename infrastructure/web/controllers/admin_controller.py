@@ -0,0 +1,42 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+
+from config.settings import settings
+from core.entities.user import User
+from core.services.model_provider import ModelProvider
+from infrastructure.observability.profiler import profiler, render_collapsed, ProfilerBusyError
+from infrastructure.web.controllers.user_controller import get_current_user, get_model_provider
+
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+async def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return current_user
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(5.0, gt=0, le=settings.PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+    admin: User = Depends(get_current_admin),
+):
+    # сэмплируем из отдельного потока, event loop в это время продолжает обслуживать запросы
+    try:
+        stacks = await asyncio.to_thread(profiler.sample, seconds, interval_ms / 1000)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(render_collapsed(stacks))
+
+@router.get("/shadow")
+async def shadow_report(
+    admin: User = Depends(get_current_admin),
+    provider: ModelProvider = Depends(get_model_provider),
+):
+    shadow = getattr(provider, "shadow", None)
+    if shadow is None:
+        raise HTTPException(status_code=404, detail="Shadow evaluation is disabled")
+    return shadow.report()
@@ -1,24 +1,37 @@
 import sqlite3
+from functools import lru_cache
 from datetime import datetime, timedelta, timezone
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Sequence, Iterator
 
-from fastapi import APIRouter, Depends, HTTPException, Header, status
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, status
+from fastapi.exceptions import RequestValidationError
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from jose import jwt, JWTError
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, ValidationError
 
 from config.settings import settings
 from core.entities.user import User
+from core.services.tracing import span
 
 from core.use_cases.user_use_cases import register_user, authenticate_user, top_up_balance
 from core.use_cases.ml_use_cases import predict_with_billing_async, InsufficientFundsError
+from core.repositories.user_repository import UserRepository
 from infrastructure.db.sqlite import SQLiteUserRepository
+from infrastructure.db.sharded_sqlite import ShardedSQLiteUserRepository
 
 from core.services.payment_provider import PaymentProvider
 from core.services.model_provider import ModelProvider
 
 from infrastructure.payments.stub_provider import StubPaymentProvider
 from infrastructure.ml.sklearn_provider import build_sklearn_provider
+from infrastructure.web.request_codecs import (
+    decode_features, check_features, max_body_bytes, UnsupportedMediaTypeError, PayloadTooLargeError, OCTET_STREAM,
+)
+from infrastructure.db.idempotency import SQLiteIdempotencyStore
+from infrastructure.web.idempotency import IdempotencyGuard, request_fingerprint
+from infrastructure.web.responses import (
+    make_response, make_list_response, user_payload, transaction_payload, predict_payload,
+)
 
 
 router = APIRouter(prefix="", tags=["auth"])
@@ -43,8 +56,19 @@ def get_db():
     finally:
         conn.close()
 
-def get_user_repo(conn: sqlite3.Connection = Depends(get_db)) -> SQLiteUserRepository:
-    return SQLiteUserRepository(conn)
+# шардированное хранилище одно на процесс: внутри пулы соединений по шардам
+@lru_cache(maxsize=1)
+def get_sharded_user_repo() -> ShardedSQLiteUserRepository:
+    return ShardedSQLiteUserRepository(
+        settings.DB_SHARD_DIR, settings.DB_SHARD_COUNT, settings.DB_POOL_SIZE, settings.DB_SYNCHRONOUS,
+    )
+
+def get_user_repo() -> Iterator[UserRepository]:
+    if settings.DB_SHARD_COUNT > 0:
+        yield get_sharded_user_repo()
+        return
+    for conn in get_db():
+        yield SQLiteUserRepository(conn)
 
 # jwt авторизация
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -63,6 +87,16 @@ def get_bearer_token(authorization: Optional[str] = Header(None)) -> str:
         )
     return authorization.split(" ", 1)[1]
 
+# Idempotency-Key для /predict и /topup: один guard на процесс (в нём реестр запросов в полёте)
+@lru_cache(maxsize=1)
+def get_idempotency_guard() -> IdempotencyGuard:
+    store = SQLiteIdempotencyStore(
+        settings.IDEMPOTENCY_DB_PATH,
+        ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS,
+        cache_size=settings.IDEMPOTENCY_CACHE_SIZE,
+    )
+    return IdempotencyGuard(store, wait_timeout=settings.IDEMPOTENCY_WAIT_SECONDS)
+
 # используем любой PaymentProvider, пока что - заглушка
 def get_payment_provider() -> PaymentProvider:
     return StubPaymentProvider()
@@ -87,7 +121,7 @@ class TopUpRequest(BaseModel):
 
 async def get_current_user(
     token: str = Depends(get_bearer_token),
-    repo: SQLiteUserRepository = Depends(get_user_repo),
+    repo: UserRepository = Depends(get_user_repo),
 ) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -95,7 +129,8 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        with span("auth.jwt_decode"):
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         sub = payload.get("sub")
         if sub is None:
             raise credentials_exception
@@ -103,13 +138,14 @@ async def get_current_user(
     except (JWTError, ValueError):
         raise credentials_exception
 
-    user = repo.get_by_id(user_id)
+    with span("auth.get_by_id"):
+        user = repo.get_by_id(user_id)
     if user is None:
         raise credentials_exception
     return user
 
 @router.post("/register", response_model=UserResponse, status_code=201)
-def register(payload: RegisterRequest, repo: SQLiteUserRepository = Depends(get_user_repo)):
+def register(payload: RegisterRequest, repo: UserRepository = Depends(get_user_repo)):
     try:
         user = register_user(repo, email=payload.email, password=payload.password)
     except ValueError as e:
@@ -125,7 +161,7 @@ def register(payload: RegisterRequest, repo: SQLiteUserRepository = Depends(get_
 @router.post("/login", response_model=TokenResponse)
 def login(
     credentials: HTTPBasicCredentials = Depends(basic_security),
-    repo: SQLiteUserRepository = Depends(get_user_repo),
+    repo: UserRepository = Depends(get_user_repo),
 ):
     user = authenticate_user(repo, email=credentials.username, password=credentials.password)
     if not user:
@@ -139,37 +175,34 @@ def login(
 
 @router.get("/me", response_model=UserResponse)
 def get_profile(current_user: User = Depends(get_current_user)):
-    return UserResponse(
-        id=current_user.id,
-        email=current_user.email,
-        is_admin=current_user.is_admin,
-        balance_cents=current_user.balance_cents,
-        created_at=current_user.created_at,
-    )
+    return make_response(UserResponse, user_payload(current_user))
 
 
 @router.post("/topup", response_model=UserResponse)
 def topup(
     payload: Optional[TopUpRequest] = None,
     current_user: User = Depends(get_current_user),
-    repo: SQLiteUserRepository = Depends(get_user_repo),
+    repo: UserRepository = Depends(get_user_repo),
     provider: PaymentProvider = Depends(get_payment_provider),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    guard: IdempotencyGuard = Depends(get_idempotency_guard),
 ):
     amount = payload.amount_cents if payload and payload.amount_cents else settings.TOPUP_DEFAULT_AMOUNT_CENTS
-    try:
-        updated = top_up_balance(repo, provider, current_user, amount)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    return UserResponse(
-        id=updated.id,
-        email=updated.email,
-        is_admin=updated.is_admin,
-        balance_cents=updated.balance_cents,
-        created_at=updated.created_at,
-    )
 
+    def handle():
+        try:
+            updated = top_up_balance(repo, provider, current_user, amount)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return make_response(UserResponse, user_payload(updated))
+
+    if idempotency_key is None:
+        return handle()
+    return guard.run(current_user.id, "topup", idempotency_key, request_fingerprint(amount), handle)
 
-# Провайдер моделей, пока что - локальный sklearn
+
+# Провайдер моделей, пока что - локальный sklearn; один на процесс, чтобы модели и теневая очередь жили между запросами
+@lru_cache(maxsize=1)
 def get_model_provider() -> ModelProvider:
     return build_sklearn_provider()
 
@@ -181,7 +214,7 @@ def get_price_table() -> Dict[str, int]:
     }
 
 class PredictRequest(BaseModel):
-    features: List[float] = Field(..., description="Вектор признаков")
+    features: List[float] = Field(..., description="Вектор признаков", max_length=settings.PREDICT_MAX_FEATURES)
 
 class PredictResponse(BaseModel):
     result: Any
@@ -189,33 +222,94 @@ class PredictResponse(BaseModel):
     balance_credits: int
     plan: str
 
-@router.post("/predict", response_model=PredictResponse)
+async def read_limited_body(request: Request, limit: int) -> bytes:
+    """Читает тело не больше limit байт: по Content-Length отказываем сразу, chunked-тело режем по ходу чтения"""
+    content_length = request.headers.get("content-length")
+    if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+        raise PayloadTooLargeError(f"Request body too large (max {limit} bytes)")
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            raise PayloadTooLargeError(f"Request body too large (max {limit} bytes)")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+async def get_predict_features(request: Request) -> Sequence[float]:
+    """Признаки из тела /predict: JSON, сырой float32/float64 буфер или msgpack"""
+    content_type = request.headers.get("content-type")
+    try:
+        body = await read_limited_body(request, max_body_bytes(content_type, settings.PREDICT_MAX_FEATURES))
+        # поток тела уже прочитан, request.body() больше недоступен — сохраняем для остальных обработчиков
+        request.state.predict_body = body
+        features = decode_features(body, content_type, settings.PREDICT_MAX_FEATURES)
+    except UnsupportedMediaTypeError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except PayloadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if features is not None:
+        return features
+    try:
+        features = PredictRequest.model_validate_json(body).features
+    except ValidationError as e:
+        errors = e.errors(include_url=False)
+        # превышение PREDICT_MAX_FEATURES — 413, как у бинарных форматов, а не 422
+        if any(err["type"] == "too_long" and err["loc"] == ("features",) for err in errors):
+            raise HTTPException(status_code=413, detail=f"Too many features (max {settings.PREDICT_MAX_FEATURES})")
+        errors = [{**err, "loc": ("body", *err["loc"])} for err in errors]
+        raise RequestValidationError(errors, body=body)
+    try:
+        return check_features(features, settings.PREDICT_MAX_FEATURES)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# тело разбираем вручную, поэтому описываем его для OpenAPI явно
+PREDICT_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": PredictRequest.model_json_schema()},
+            OCTET_STREAM: {"schema": {"type": "string", "format": "binary"}},
+            "application/msgpack": {"schema": {"type": "string", "format": "binary"}},
+        },
+    }
+}
+
+@router.post("/predict", response_model=PredictResponse, openapi_extra=PREDICT_REQUEST_BODY)
 async def predict(
-    payload: PredictRequest,
+    request: Request,
+    # сначала аутентификация: без токена — 401, тело не читаем
     current_user: User = Depends(get_current_user),
-    repo: SQLiteUserRepository = Depends(get_user_repo),
+    repo: UserRepository = Depends(get_user_repo),
+    features: Sequence[float] = Depends(get_predict_features),
     provider: ModelProvider = Depends(get_model_provider),
     prices: Dict[str, int] = Depends(get_price_table),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    guard: IdempotencyGuard = Depends(get_idempotency_guard),
 ):
-    try:
-        result, charged, updated_user = await predict_with_billing_async(
-            repo=repo,
-            provider=provider,
-            user=current_user,
-            features=payload.features,
-            prices=prices,
-        )
-    except InsufficientFundsError:
-        raise HTTPException(status_code=402, detail="Insufficient funds")
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-
-    return PredictResponse(
-      result=result,
-      charged_credits=charged,
-      balance_credits=updated_user.balance_cents,
-      plan=updated_user.plan,
-    )
+    async def handle():
+        try:
+            result, charged, updated_user = await predict_with_billing_async(
+                repo=repo,
+                provider=provider,
+                user=current_user,
+                features=features,
+                prices=prices,
+            )
+        except InsufficientFundsError:
+            raise HTTPException(status_code=402, detail="Insufficient funds")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return make_response(PredictResponse, predict_payload(result, charged, updated_user))
+
+    if idempotency_key is None:
+        return await handle()
+    # тело уже прочитано в get_predict_features
+    fingerprint = request_fingerprint(request.headers.get("content-type", ""), request.state.predict_body)
+    return await guard.run_async(current_user.id, "predict", idempotency_key, fingerprint, handle)
 
 class PlanRequest(BaseModel):
     plan: str  # basic | pro | premium
@@ -230,7 +324,7 @@ class PlanResponse(BaseModel):
 def change_plan(
     payload: PlanRequest,
     current_user: User = Depends(get_current_user),
-    repo: SQLiteUserRepository = Depends(get_user_repo),
+    repo: UserRepository = Depends(get_user_repo),
 ):
     plan = payload.plan.lower().strip()
     if plan not in {"basic", "pro", "premium"}:
@@ -248,19 +342,9 @@ def get_transactions(
     limit: int = 50,
     offset: int = 0,
     current_user: User = Depends(get_current_user),
-    repo: SQLiteUserRepository = Depends(get_user_repo),
+    repo: UserRepository = Depends(get_user_repo),
 ):
     limit = max(1, min(100, int(limit)))  # пагинация, не хотим возвращать много
     offset = max(0, int(offset))
     txs = repo.list_transactions(current_user.id, limit=limit, offset=offset)
-    return [
-        TransactionItem(
-            id=tx.id,
-            type=tx.type,
-            amount_cents=tx.amount_cents,
-            balance_after=tx.balance_after,
-            metadata=tx.metadata,
-            created_at=tx.created_at,
-        )
-        for tx in txs
-    ]
+    return make_list_response(TransactionItem, [transaction_payload(tx) for tx in txs])
@@ -0,0 +1,183 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Response
+from pydantic import BaseModel
+
+from infrastructure.db.idempotency import SQLiteIdempotencyStore, StoredResponse
+from infrastructure.web.responses import dumps
+
+
+logger = logging.getLogger("idempotency")
+
+MAX_KEY_LENGTH = 255
+REPLAY_HEADER = "Idempotent-Replayed"
+
+
+def request_fingerprint(*parts: Any) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _render(result: Any) -> Tuple[int, bytes]:
+    if isinstance(result, Response):
+        return result.status_code, bytes(result.body)
+    if isinstance(result, BaseModel):
+        return 200, dumps(result.model_dump(mode="json"))
+    return 200, dumps(result)
+
+
+class IdempotencyGuard:
+    """Idempotency-Key: готовые ответы берутся из store, одновременные дубли ждут исходный запрос (single-flight).
+
+    Ошибки не сохраняются: повтор после ошибки выполняется заново, но ожидающие дубли получают ту же ошибку.
+    Future из concurrent.futures, чтобы ждать одинаково из event loop и из threadpool (sync-эндпоинты).
+    """
+    def __init__(self, store: SQLiteIdempotencyStore, wait_timeout: float = 30.0):
+        self.store = store
+        self.wait_timeout = wait_timeout
+        self._inflight: Dict[Tuple[int, str, str], Future] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _check_key(key: str) -> None:
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1..{MAX_KEY_LENGTH} characters")
+
+    @staticmethod
+    def _replay(stored: StoredResponse, fingerprint: str) -> Response:
+        if stored.fingerprint != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+        return Response(
+            content=stored.body,
+            status_code=stored.status_code,
+            media_type="application/json",
+            headers={REPLAY_HEADER: "true"},
+        )
+
+    def _claim(self, ident: Tuple[int, str, str]) -> Tuple[Future, bool]:
+        with self._lock:
+            future = self._inflight.get(ident)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._inflight[ident] = future
+            return future, True
+
+    def _release(self, ident: Tuple[int, str, str]) -> None:
+        with self._lock:
+            self._inflight.pop(ident, None)
+
+    def _lookup(self, ident: Tuple[int, str, str], fingerprint: str) -> Optional[Response]:
+        stored = self.store.get(*ident)
+        return self._replay(stored, fingerprint) if stored is not None else None
+
+    def _busy(self) -> HTTPException:
+        return HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+
+    def _fail(self, future: Future, error: BaseException) -> None:
+        if future.done():
+            return
+        if isinstance(error, Exception):
+            future.set_exception(error)
+        else:
+            # отмена исходного запроса (клиент отключился) не должна отменять ожидающих
+            future.set_exception(HTTPException(status_code=409, detail="Original request with this Idempotency-Key was interrupted"))
+
+    def _finish(self, ident: Tuple[int, str, str], fingerprint: str, future: Future, result: Any) -> None:
+        """Сохраняет ответ и будит ожидающих; не бросает исключений.
+
+        Обработчик уже отработал (и, возможно, списал деньги), поэтому сбой store (database is locked,
+        нет места на диске) логируется, а не превращает успешный ответ в 500.
+        """
+        try:
+            status_code, body = _render(result)
+        except Exception as e:
+            logger.exception("Failed to render idempotent response for %s", ident[1])
+            self._fail(future, e)
+            return
+        try:
+            stored = self.store.put(*ident, fingerprint=fingerprint, status_code=status_code, body=body)
+        except Exception:
+            logger.exception("Failed to store idempotent response for %s key=%r", ident[1], ident[2])
+            stored = StoredResponse(fingerprint=fingerprint, status_code=status_code, body=body, expires_at=time.time())
+        future.set_result(stored)
+
+    async def run_async(self, user_id: int, scope: str, key: str, fingerprint: str,
+                        handler: Callable[[], Awaitable[Any]]) -> Any:
+        self._check_key(key)
+        ident = (int(user_id), scope, key)
+        # store — SQLite под threading.Lock, который держат и потоки threadpool: не блокируем event loop
+        replay = await asyncio.to_thread(self._lookup, ident, fingerprint)
+        if replay is not None:
+            return replay
+
+        future, owner = self._claim(ident)
+        if not owner:
+            try:
+                # shield: таймаут ожидающего не должен отменять общий future
+                stored = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.wait_timeout)
+            except asyncio.TimeoutError:
+                raise self._busy()
+            return self._replay(stored, fingerprint)
+
+        try:
+            # исходный запрос мог завершиться между lookup и claim
+            stored = await asyncio.to_thread(self.store.get, *ident)
+            if stored is None:
+                result = await handler()
+            else:
+                future.set_result(stored)
+        except BaseException as e:
+            self._fail(future, e)
+            self._release(ident)
+            raise
+        try:
+            if stored is None:
+                # при отмене ожидания поток всё равно допишет ответ и разбудит ожидающих
+                await asyncio.to_thread(self._finish, ident, fingerprint, future, result)
+                return result
+        finally:
+            self._release(ident)
+        return self._replay(stored, fingerprint)
+
+    def run(self, user_id: int, scope: str, key: str, fingerprint: str, handler: Callable[[], Any]) -> Any:
+        self._check_key(key)
+        ident = (int(user_id), scope, key)
+        replay = self._lookup(ident, fingerprint)
+        if replay is not None:
+            return replay
+
+        future, owner = self._claim(ident)
+        if not owner:
+            try:
+                stored = future.result(timeout=self.wait_timeout)
+            except FutureTimeoutError:
+                raise self._busy()
+            return self._replay(stored, fingerprint)
+
+        try:
+            stored = self.store.get(*ident)
+            if stored is None:
+                result = handler()
+            else:
+                future.set_result(stored)
+        except BaseException as e:
+            self._fail(future, e)
+            self._release(ident)
+            raise
+        try:
+            if stored is None:
+                self._finish(ident, fingerprint, future, result)
+                return result
+        finally:
+            self._release(ident)
+        return self._replay(stored, fingerprint)
@@ -0,0 +1,127 @@
+from typing import Optional, Sequence, Tuple
+import numpy as np
+
+
+try:
+    import msgpack
+except Exception:
+    msgpack = None
+
+
+OCTET_STREAM = "application/octet-stream"
+MSGPACK_TYPES = {"application/msgpack", "application/x-msgpack"}
+
+# little-endian, как договорились с клиентами
+DTYPES = {
+    "float32": np.dtype("<f4"),
+    "float64": np.dtype("<f8"),
+}
+DEFAULT_DTYPE = "float64"
+
+# оценки размера тела сверху на один признак, чтобы отсекать огромные тела до чтения
+MSGPACK_ITEM_BYTES = 9      # float64/int64 в msgpack: маркер + 8 байт
+JSON_ITEM_BYTES = 32        # число текстом вместе с разделителем
+FRAMING_SLACK = 1024        # заголовок массива, обёртка {"features": ...}, пробелы JSON
+
+
+class UnsupportedMediaTypeError(ValueError):
+    pass
+
+class PayloadTooLargeError(ValueError):
+    pass
+
+
+def parse_content_type(header: Optional[str]) -> Tuple[str, dict]:
+    """'application/octet-stream; dtype=float32' -> ('application/octet-stream', {'dtype': 'float32'})"""
+    if not header:
+        return "application/json", {}
+    media_type, *raw_params = header.split(";")
+    params = {}
+    for item in raw_params:
+        name, _, value = item.partition("=")
+        if name.strip():
+            params[name.strip().lower()] = value.strip().strip('"').lower()
+    return media_type.strip().lower(), params
+
+
+def _is_json(media_type: str) -> bool:
+    return media_type == "application/json" or media_type.endswith("+json")
+
+
+def _resolve_dtype(name: Optional[str]) -> np.dtype:
+    dtype = DTYPES.get((name or DEFAULT_DTYPE).lower())
+    if dtype is None:
+        raise ValueError(f"Unsupported dtype, expected one of: {', '.join(DTYPES)}")
+    return dtype
+
+
+def check_features(values: Sequence[float], max_features: int) -> np.ndarray:
+    """Общие для всех форматов проверки: вектор непустой, не длиннее max_features, только конечные числа"""
+    arr = np.asarray(values)
+    if arr.size == 0:
+        raise ValueError("Empty feature vector")
+    if arr.size > max_features:
+        raise PayloadTooLargeError(f"Too many features (max {max_features})")
+    if not np.isfinite(arr).all():
+        raise ValueError("Features must be finite numbers")
+    return arr
+
+
+def decode_buffer(body: bytes, dtype_name: Optional[str], max_features: int) -> np.ndarray:
+    """Сырые little-endian float32/float64 -> np.ndarray без копирования"""
+    dtype = _resolve_dtype(dtype_name)
+    # тело уже ограничено max_body_bytes при чтении; здесь точная проверка до frombuffer
+    if len(body) > max_features * dtype.itemsize:
+        raise PayloadTooLargeError(f"Too many features (max {max_features})")
+    if len(body) % dtype.itemsize:
+        raise ValueError(f"Body size must be a multiple of {dtype.itemsize} bytes")
+    return check_features(np.frombuffer(body, dtype=dtype), max_features)
+
+
+def decode_msgpack(body: bytes, dtype_name: Optional[str], max_features: int) -> np.ndarray:
+    """msgpack: либо bin с сырым буфером, либо массив чисел; допускается обёртка {"features": ...}"""
+    if msgpack is None:
+        raise UnsupportedMediaTypeError("msgpack is not available on this server")
+    try:
+        obj = msgpack.unpackb(body, raw=False)
+    except Exception:
+        raise ValueError("Malformed msgpack body")
+    if isinstance(obj, dict):
+        obj = obj.get("features")
+    if isinstance(obj, (bytes, bytearray)):
+        return decode_buffer(bytes(obj), dtype_name, max_features)
+    if isinstance(obj, list):
+        if len(obj) > max_features:
+            raise PayloadTooLargeError(f"Too many features (max {max_features})")
+        try:
+            arr = np.asarray(obj, dtype=np.float64)
+        except (TypeError, ValueError):
+            raise ValueError("Features must be numbers")
+        if arr.ndim != 1:
+            raise ValueError("Features must be a flat array")
+        return check_features(arr, max_features)
+    raise ValueError("Expected features as msgpack array or bin")
+
+
+def max_body_bytes(content_type: Optional[str], max_features: int) -> int:
+    """Максимальный допустимый размер тела /predict для данного Content-Type"""
+    media_type, params = parse_content_type(content_type)
+    if media_type == OCTET_STREAM:
+        return max_features * _resolve_dtype(params.get("dtype")).itemsize
+    if media_type in MSGPACK_TYPES:
+        return max_features * MSGPACK_ITEM_BYTES + FRAMING_SLACK
+    if _is_json(media_type):
+        return max_features * JSON_ITEM_BYTES + FRAMING_SLACK
+    raise UnsupportedMediaTypeError(f"Unsupported Content-Type: {media_type}")
+
+
+def decode_features(body: bytes, content_type: Optional[str], max_features: int) -> Optional[np.ndarray]:
+    """Декодирует бинарное тело /predict. Для JSON возвращает None — его разбирает pydantic"""
+    media_type, params = parse_content_type(content_type)
+    if media_type == OCTET_STREAM:
+        return decode_buffer(body, params.get("dtype"), max_features)
+    if media_type in MSGPACK_TYPES:
+        return decode_msgpack(body, params.get("dtype"), max_features)
+    if _is_json(media_type):
+        return None
+    raise UnsupportedMediaTypeError(f"Unsupported Content-Type: {media_type}")
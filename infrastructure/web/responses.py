@@ -0,0 +1,78 @@
+from typing import Any, Dict, List, Type
+import json
+
+import numpy as np
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from config.settings import settings
+from core.entities.user import User
+from core.entities.transaction import Transaction
+
+
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """NumPy-скаляры и массивы для stdlib json (если orjson не установлен)"""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse на orjson с нативной поддержкой NumPy"""
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# dict-представления ответов, собираются напрямую из сущностей
+def user_payload(user: User) -> Dict[str, Any]:
+    return {
+        "id": user.id,
+        "email": user.email,
+        "is_admin": user.is_admin,
+        "balance_cents": user.balance_cents,
+        "created_at": user.created_at,
+    }
+
+def transaction_payload(tx: Transaction) -> Dict[str, Any]:
+    return {
+        "id": tx.id,
+        "type": tx.type,
+        "amount_cents": tx.amount_cents,
+        "balance_after": tx.balance_after,
+        "metadata": tx.metadata,
+        "created_at": tx.created_at,
+    }
+
+def predict_payload(result: Any, charged: int, user: User) -> Dict[str, Any]:
+    return {
+        "result": result,
+        "charged_credits": charged,
+        "balance_credits": user.balance_cents,
+        "plan": user.plan,
+    }
+
+
+def make_response(model: Type[BaseModel], payload: Dict[str, Any]) -> Any:
+    """В режиме FAST_RESPONSES отдаём dict сразу, минуя повторную валидацию по response_model"""
+    if settings.FAST_RESPONSES:
+        return FastJSONResponse(payload)
+    return model(**payload)
+
+def make_list_response(model: Type[BaseModel], payloads: List[Dict[str, Any]]) -> Any:
+    if settings.FAST_RESPONSES:
+        return FastJSONResponse(payloads)
+    return [model(**p) for p in payloads]
@@ -0,0 +1,38 @@
+import logging
+
+from core.services.tracing import start_trace, end_trace
+
+
+logger = logging.getLogger("slow_requests")
+
+
+class SlowRequestLogMiddleware:
+    """ASGI-middleware: открывает trace на запрос и логирует разбивку по стадиям, если запрос медленнее порога"""
+    def __init__(self, app, threshold_ms: float):
+        self.app = app
+        self.threshold_ms = threshold_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        trace, token = start_trace(f"{scope['method']} {scope['path']}")
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            end_trace(token)
+            elapsed_ms = trace.elapsed() * 1000
+            if elapsed_ms >= self.threshold_ms:
+                logger.warning(
+                    "Slow request %s status=%s total=%.2fms %s",
+                    trace.name, status_code, elapsed_ms, trace.breakdown(),
+                )
@@ -1,7 +1,11 @@
 from fastapi import FastAPI
 from config.settings import settings
 from infrastructure.db.sqlite import init_db
-from infrastructure.web.controllers.user_controller import router as user_router
+from infrastructure.db.sharded_sqlite import init_sharded_db
+from infrastructure.db.idempotency import init_idempotency_db
+from infrastructure.web.controllers.user_controller import router as user_router, get_model_provider
+from infrastructure.web.controllers.admin_controller import router as admin_router
+from infrastructure.web.slow_requests import SlowRequestLogMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 from models.basic.model_basic import TruncatedNormalModel
 import sys
@@ -24,8 +28,27 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+if settings.SLOW_REQUEST_MS > 0:
+    app.add_middleware(SlowRequestLogMiddleware, threshold_ms=settings.SLOW_REQUEST_MS)
+
 @app.on_event("startup")
 def on_startup():
-    init_db(settings.DB_PATH)
+    if settings.DB_SHARD_COUNT > 0:
+        print(f"Experimental sharded storage: {settings.DB_SHARD_COUNT} shards in {settings.DB_SHARD_DIR}")
+        init_sharded_db(settings.DB_SHARD_DIR, settings.DB_SHARD_COUNT)
+    else:
+        init_db(settings.DB_PATH)
+    init_idempotency_db(settings.IDEMPOTENCY_DB_PATH)
+
+@app.on_event("shutdown")
+def on_shutdown():
+    # провайдер создаётся лениво: если его не было, не загружаем модели ради остановки
+    if get_model_provider.cache_info().currsize == 0:
+        return
+    shadow = getattr(get_model_provider(), "shadow", None)
+    if shadow is not None:
+        # иначе executor (не daemon) при выходе досчитал бы всю теневую очередь
+        shadow.close()
 
 app.include_router(user_router)
+app.include_router(admin_router)